@@ -5,52 +5,112 @@
 This tool requires that AWS CLI version 2.15+ is installed. It also requires
 that the CLI be configured to connect to the performance testing iRODS zone by
 default.
+
+The CLI is run with tuned S3 transfer settings. These are applied to a
+temporary copy of the CLI configuration file, so the user's configuration is
+left unchanged.
 """
 
-import subprocess
-from subprocess import CalledProcessError
+import configparser
+import os
+import tempfile
+import weakref
 
-from suite import TestFailure, Tool
+from suite import Tool, run_command
 
 _READ_TIMEOUT = 300
 
+_MAX_ATTEMPTS = 3
+
+_S3_SETTINGS = {
+    'max_concurrent_requests': '50',
+    'multipart_chunksize': '16MB',
+}
+
+
+def _mk_tuned_config() -> str:
+    """
+    This copies the AWS CLI configuration file, adding the tuned S3 transfer
+    settings to the active profile. It returns the path to the copy.
+    """
+    config = configparser.RawConfigParser()
+    config.read(os.environ.get('AWS_CONFIG_FILE', os.path.expanduser('~/.aws/config')))
+    profile = os.environ.get('AWS_PROFILE', 'default')
+    section = profile if profile == 'default' else f'profile {profile}'
+    if not config.has_section(section):
+        config.add_section(section)
+    s3_settings = {}
+    for line in config.get(section, 's3', fallback='').splitlines():
+        if '=' in line:
+            key, value = line.split('=', 1)
+            s3_settings[key.strip()] = value.strip()
+    s3_settings.update(_S3_SETTINGS)
+    config.set(
+        section,
+        's3',
+        ''.join(f'\n{key} = {value}' for key, value in s3_settings.items()))
+    fd, config_file = tempfile.mkstemp(prefix='aws-config-')
+    with os.fdopen(fd, mode='w') as file:
+        config.write(file)
+    return config_file
+
+
+def _mk_cp_cmd(src: str, dest: str, *options: str):
+    """
+    This builds the AWS CLI command to copy an object from a source to a
+    destination within S3 storage. Any additional cp options may be given.
+    """
+    return [
+        'aws',
+        f'--cli-read-timeout={_READ_TIMEOUT}',
+        's3',
+        'cp',
+        '--only-show-errors',
+        *options,
+        src,
+        dest]
+
 
 class AWS(Tool):
     """This provides the transfer logic for testing AWS CLI.
+    The CLI is measured with tuned transfer concurrency, i.e., 50 concurrent
+    requests and 16 MB multipart chunks, rather than its defaults.
     Parameters:
         bucket  This is the name of the bucket where data will be transferred
             to and from.
     """
 
+    __slots__ = ('__bucket_uri', '__env', '__weakref__')
+
     def __init__(self, bucket: str):
         self.__bucket_uri = f's3://{bucket}'
+        config_file = _mk_tuned_config()
+        weakref.finalize(self, os.remove, config_file)
+        self.__env = {
+            **os.environ,
+            'AWS_CONFIG_FILE': config_file,
+            'AWS_MAX_ATTEMPTS': str(_MAX_ATTEMPTS),
+        }
 
     def __str__(self):
         return "iRODS S3 API over AWS CLI"
 
-    def download(self, path: str):
-        self.__cp(self.__mk_path_uri(path), path)
+    async def download(self, data_obj: str, file: str):
+        await self.__cp(self.__mk_path_uri(data_obj), file)
+
+    async def upload(self, file: str, data_obj: str):
+        await self.__cp(file, self.__mk_path_uri(data_obj))
 
-    def upload(self, path: str):
-        self.__cp(path, self.__mk_path_uri(path))
+    async def batch_upload(self, directory: str, collection: str):
+        # A single recursive copy uploads all of the files with one CLI process.
+        await self.__cp(directory, self.__mk_path_uri(collection), '--recursive')
 
-    def __cp(self, src: str, dest: str):
+    async def __cp(self, src: str, dest: str, *options: str):
         """
-        This method builds the AWS CLI command to copy an object from a
+        This method runs the AWS CLI command to copy an object from a
         source to a destination within S3 storage.
         """
-        try:
-            exe = [
-                'aws',
-                f'--cli-read-timeout={_READ_TIMEOUT}',
-                's3',
-                'cp',
-                '--only-show-errors',
-                src,
-                dest]
-            subprocess.run(exe, capture_output=True, check=True)
-        except CalledProcessError as cpe:
-            raise TestFailure(cpe.stderr.decode()) from cpe
+        await run_command(_mk_cp_cmd(src, dest, *options), env=self.__env)
 
     def __mk_path_uri(self, path: str):
         return f"{self.__bucket_uri}/{path}"
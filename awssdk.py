@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+"""This is the implementation of a Tool class for the AWS SDK for Python.
+
+This tool uses boto3 to access the iRODS S3 API. A single S3 client is reused
+for every transfer, so unlike the AWS CLI tool, no process is started per
+transfer. Since boto3 blocks, its transfers are run in a worker thread. It
+requires that the AWS configuration used by boto3 connect to the
+performance testing iRODS zone by default.
+"""
+
+import asyncio
+
+import boto3
+from boto3.exceptions import Boto3Error
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+from suite import TestFailure, Tool
+
+_READ_TIMEOUT = 300
+
+_MAX_POOL_CONNECTIONS = 50
+
+_TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * 2 ** 20, max_concurrency=20)
+
+
+class AWSSDK(Tool):
+    """This provides the transfer logic for testing boto3.
+    Parameters:
+        bucket  This is the name of the bucket where data will be transferred
+            to and from.
+    """
+
+    __slots__ = ('__bucket', '__s3')
+
+    def __init__(self, bucket: str):
+        self.__bucket = bucket
+        self.__s3 = boto3.client(
+            's3',
+            config=Config(
+                read_timeout=_READ_TIMEOUT, max_pool_connections=_MAX_POOL_CONNECTIONS))
+
+    def __reduce__(self):
+        # boto3 clients can't be pickled, so a copy gets its own client.
+        return (type(self), (self.__bucket,))
+
+    def __str__(self):
+        return "iRODS S3 API over boto3"
+
+    async def download(self, data_obj: str, file: str):
+        try:
+            await asyncio.to_thread(
+                self.__s3.download_file,
+                self.__bucket,
+                data_obj,
+                file,
+                Config=_TRANSFER_CONFIG)
+        except (BotoCoreError, ClientError, Boto3Error, OSError) as exn:
+            raise TestFailure(str(exn)) from exn
+
+    async def upload(self, file: str, data_obj: str):
+        try:
+            await asyncio.to_thread(
+                self.__s3.upload_file,
+                file,
+                self.__bucket,
+                data_obj,
+                Config=_TRANSFER_CONFIG)
+        except (BotoCoreError, ClientError, Boto3Error, OSError) as exn:
+            raise TestFailure(str(exn)) from exn
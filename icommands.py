@@ -7,26 +7,19 @@ that an iCommands session be initialized for the iRODS zone where performance
 testing will happen.
 """
 
-import subprocess
-from subprocess import CalledProcessError
-
-from suite import TestFailure, Tool
+from suite import Tool, run_command
 
 
 class ICommands(Tool):
     """This provides the transfer logic for testing iCommands."""
 
+    __slots__ = ()
+
     def __str__(self):
         return 'iCommands'
 
-    def download(self, path: str):
-        try:
-            subprocess.run(['iget', path], capture_output=True, check=True)
-        except CalledProcessError as cpe:
-            raise TestFailure(cpe.stderr.decode()) from cpe
-
-    def upload(self, path: str):
-        try:
-            subprocess.run(['iput', path], capture_output=True, check=True)
-        except CalledProcessError as cpe:
-            raise TestFailure(cpe.stderr.decode()) from cpe
+    async def download(self, data_obj: str, file: str):
+        await run_command(['iget', data_obj, file])
+
+    async def upload(self, file: str, data_obj: str):
+        await run_command(['iput', file, data_obj])
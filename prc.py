@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+"""This is the implementation of a Tool class for the Python iRODS Client.
+
+This tool transfers data with the python-irodsclient's own parallel transfer
+logic through a single session, so no process is started per transfer. It
+requires that an iRODS session be initialized for the iRODS zone where
+performance testing will happen.
+"""
+
+import asyncio
+import os
+from os import path
+import weakref
+
+from irods.exception import iRODSException, PycommandsException
+from irods.session import iRODSSession
+
+from suite import TestFailure, Tool
+
+# As with iCommands, 0 lets the server choose the number of transfer threads.
+_NUM_THREADS = 0
+
+try:
+    _IRODS_ENV_FILE = os.environ['IRODS_ENVIRONMENT_FILE']
+except KeyError:
+    _IRODS_ENV_FILE = path.expanduser('~/.irods/irods_environment.json')
+
+
+class PRC(Tool):
+    """This provides the transfer logic for testing the Python iRODS Client."""
+
+    __slots__ = ('__session', '__weakref__')
+
+    def __init__(self):
+        self.__session = iRODSSession(irods_env_file=_IRODS_ENV_FILE)
+        weakref.finalize(self, self.__session.cleanup)
+
+    def __reduce__(self):
+        # Sessions can't be pickled, so a copy opens its own session.
+        return (type(self), ())
+
+    def __str__(self):
+        return "Python iRODS Client"
+
+    async def download(self, data_obj: str, file: str):
+        try:
+            await asyncio.to_thread(
+                self.__session.data_objects.get,
+                self.__abs_path(data_obj),
+                file,
+                num_threads=_NUM_THREADS)
+        except (iRODSException, PycommandsException, OSError) as exn:
+            raise TestFailure(str(exn)) from exn
+
+    async def upload(self, file: str, data_obj: str):
+        try:
+            await asyncio.to_thread(
+                self.__session.data_objects.put,
+                file,
+                self.__abs_path(data_obj),
+                num_threads=_NUM_THREADS)
+        except (iRODSException, PycommandsException, OSError) as exn:
+            raise TestFailure(str(exn)) from exn
+
+    def __abs_path(self, data_obj: str):
+        return f"/{self.__session.zone}/home/{self.__session.username}/{data_obj}"
@@ -18,11 +18,19 @@ a certain action once.
 """
 
 from abc import ABC, abstractmethod
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 import math
-import timeit
-from typing import List, Optional
+import multiprocessing
+import os
+from os import path
+import time
+from typing import Dict, List, Optional
 
-import numpy
+# Below this many measurements, the statistics are computed in pure Python,
+# since numpy's dispatch overhead dominates for small inputs. numpy is only
+# imported when it is needed.
+_NUMPY_MIN_MEASUREMENTS = 16
 
 
 class Recorder(ABC):
@@ -42,6 +50,17 @@ class Recorder(ABC):
             result  the test result
         """
 
+    def notify_batch(self, msgs: List[str]) -> None:
+        """This sends a sequence of notification messages at once.
+        By default, each message is sent with `notify`. Recorders that can
+        deliver several messages more cheaply than one at a time should
+        override this.
+        Args:
+            msgs  the messages in the order they were generated
+        """
+        for msg in msgs:
+            self.notify(msg)
+
 
 class TestFailure(Exception):
     """This indicates that a test has failed.
@@ -57,29 +76,67 @@ class TestFailure(Exception):
 
 
 class Tool(ABC):
-    """This is a tool whose performance is to be tested."""
+    """This is a tool whose performance is to be tested.
+    Subclasses should declare `__slots__` to keep attribute access during
+    transfers cheap.
+    """
+
+    __slots__ = ()
 
     @abstractmethod
     def __str__(self) -> str:
         """This returns the name of the tool."""
 
     @abstractmethod
-    def download(self, path: str) -> None:
+    async def download(self, data_obj: str, file: str) -> None:
         """This downloads a copy of an iRODS data object.
         Args:
-            path  This is the path to the data object relative to the current
-                working collection. It is also the path to the downloaded file
-                relative to the current working directory.
+            data_obj  This is the path to the data object relative to the
+                current working collection.
+            file      This is the path to the downloaded file. If it is
+                relative, it is relative to the current working directory.
         """
 
     @abstractmethod
-    def upload(self, path: str) -> None:
+    async def upload(self, file: str, data_obj: str) -> None:
         """This uploads a file to iRODS.
         Args:
-            path  This is the path to the file relative to the current working
-                directory. It is also the path to the resulting data object
-                relative to the current working collection.
+            file      This is the path to the file. If it is relative, it is
+                relative to the current working directory.
+            data_obj  This is the path to the resulting data object relative to
+                the current working collection.
+        """
+
+    async def batch_upload(self, directory: str, collection: str) -> None:
+        """This uploads every file in a directory to an existing collection.
+        By default, each file is uploaded with `upload`. Tools that can upload
+        many files more cheaply than one at a time should override this.
+        Args:
+            directory   This is the path to the directory. If it is relative,
+                it is relative to the current working directory.
+            collection  This is the path to the collection relative to the
+                current working collection. Each data object has the same
+                name as its file.
         """
+        for name in sorted(os.listdir(directory)):
+            await self.upload(path.join(directory, name), f'{collection}/{name}')
+
+
+async def run_command(cmd: List[str], env: Optional[Dict[str, str]] = None) -> None:
+    """This runs an external command without blocking the event loop.
+    Args:
+        cmd  This is the command to run followed by its arguments.
+        env  This is the environment for the command. If it is `None`, the
+            command inherits the current environment.
+    Raises:
+        TestFailure  This is raised if the command exits with a nonzero status.
+            The reason is the command's error output.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, env=env, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    _, err = await proc.communicate()
+    if proc.returncode:
+        raise TestFailure(err.decode())
 
 
 class Test(ABC):
@@ -88,11 +145,13 @@ class Test(ABC):
     action being tested.
     """
 
+    __slots__ = ('__dt',)
+
     def __init__(self):
         self.__dt = None
 
     @abstractmethod
-    def _run(self) -> None:
+    async def _run(self) -> None:
         """This executes the action being tested."""
 
     @abstractmethod
@@ -103,19 +162,24 @@ class Test(ABC):
     def _tear_down(self) -> None:
         """This cleans up the environment after the run."""
 
-    def perform(self) -> None:
+    async def perform(self) -> None:
         """This performs the test."""
         try:
-            self._set_up()
-            self.__dt = timeit.timeit(self._run, number=1)
+            await asyncio.to_thread(self._set_up)
+            # The run's coroutine is created before timing starts, so that
+            # only its execution is measured.
+            run = self._run()
+            start = time.perf_counter_ns()
+            await run
+            self.__dt = time.perf_counter_ns() - start
         finally:
             try:
-                self._tear_down()
+                await asyncio.to_thread(self._tear_down)
             except TestFailure:
                 pass
 
-    def duration(self) -> Optional[float]:
-        """This returns how long the test took to run in seconds.
+    def duration(self) -> Optional[int]:
+        """This returns how long the test took to run in nanoseconds.
         If the test has not been run, `None` is returned.
         """
         return self.__dt
@@ -129,24 +193,65 @@ class TestFactory(ABC):
         """This is the name of the test created by this factory."""
 
     @abstractmethod
-    def make_test(self, tool: Tool) -> Test:
+    def make_test(self, tool: Tool, tool_id: int) -> Test:
         """
         This creates a test that uses a given tool to perform the action being
         tested.
 
         Args:
-            tool  The tool used to perform the action.
+            tool     The tool used to perform the action.
+            tool_id  This identifies the tool among the tools under test. It
+                distinguishes tools of the same kind.
         """
 
+    def set_up_shared(self) -> None:
+        """
+        This prepares the environment shared by all of the tests created by
+        this factory. It is called once before any of them are performed.
+        """
+
+    def tear_down_shared(self) -> None:
+        """
+        This cleans up the environment shared by all of the tests created by
+        this factory. It is called once after all of them have been performed.
+        """
+
+
+class _BufferedRecorder(Recorder):
+    """This holds messages so they can be delivered to another recorder later."""
+
+    def __init__(self):
+        self.__msgs = []
+
+    def notify(self, msg: str) -> None:
+        self.__msgs.append((False, msg))
+
+    def log(self, result: str) -> None:
+        self.__msgs.append((True, result))
+
+    def replay(self, recorder: Recorder) -> None:
+        """This delivers the held messages in order to the given recorder."""
+        for is_result, msg in self.__msgs:
+            if is_result:
+                recorder.log(msg)
+            else:
+                recorder.notify(msg)
+
 
 class _TestResult:
 
-    def __init__(self, measurements: List[float]):
-        if measurements:
-            geo_mean = numpy.exp(numpy.log(measurements).mean())
-            ln_var = numpy.square(numpy.log(numpy.divide(measurements, geo_mean))).mean()
-            self.__geo_mean = geo_mean
-            self.__geo_std = numpy.exp(numpy.sqrt(ln_var))
+    def __init__(self, measurements_ns: List[int]):
+        if len(measurements_ns) >= _NUMPY_MIN_MEASUREMENTS:
+            import numpy
+            logs = numpy.log(numpy.asarray(measurements_ns, dtype=numpy.float64))
+            self.__geo_mean = math.exp(logs.mean()) * 1e-9
+            self.__geo_std = math.exp(logs.std())
+        elif measurements_ns:
+            logs = [math.log(m) for m in measurements_ns]
+            ln_mean = math.fsum(logs) / len(logs)
+            ln_var = math.fsum((ln - ln_mean) ** 2 for ln in logs) / len(logs)
+            self.__geo_mean = math.exp(ln_mean) * 1e-9
+            self.__geo_std = math.exp(math.sqrt(ln_var))
         else:
             self.__geo_mean = float('nan')
             self.__geo_std = float('inf')
@@ -172,71 +277,143 @@ class _TestResult:
 
 class _ToolRun:
 
-    def __init__(self, run_id: int, tool: Tool, test_maker: TestFactory):
+    def __init__(self, run_id: int, tool_id: int, tool: Tool, test_maker: TestFactory):
         self.__id = run_id
         self.__test_maker = test_maker
+        self.__tool_id = tool_id
         self.__tool = tool
         self.__result = None
 
-    def perform(self, recorder: Recorder) -> None:
-        """This uses the tool to perform the action being tested."""
+    async def perform(self, notes: List[str]) -> None:
+        """This uses the tool to perform the action being tested.
+        Args:
+            notes  Notification messages are appended to this list.
+        """
         label = f"run {self.__id} of {self.__test_maker.test_name()} using {self.__tool}"
-        recorder.notify(f"performing {label}")
-        test = self.__test_maker.make_test(self.__tool)
+        notes.append(f"performing {label}")
+        test = self.__test_maker.make_test(self.__tool, self.__tool_id)
         try:
-            test.perform()
+            await test.perform()
             self.__result = test.duration()
         except TestFailure as tf:
-            recorder.notify(f"{label} failed: {tf}")
+            notes.append(f"{label} failed: {tf}")
 
-    def duration(self) -> Optional[float]:
+    def duration(self) -> Optional[int]:
         """
-        This is how long it took in seconds for the tool to perform the action
-        being tested.
+        This is how long it took in nanoseconds for the tool to perform the
+        action being tested.
         """
         return self.__result
 
 
 class _ToolRunSet:
 
-    def __init__(self, num_runs: int, tool: Tool, test_maker: TestFactory):
+    def __init__(
+        self,
+        num_runs: int,
+        tool_id: int,
+        tool: Tool,
+        test_maker: TestFactory,
+        concurrent: bool
+    ):
         self.__test_maker = test_maker
         self.__tool = tool
+        self.__concurrent = concurrent
         self.__runs = [
-            _ToolRun(run_id, tool, test_maker)
+            _ToolRun(run_id, tool_id, tool, test_maker)
             for run_id in range(1, num_runs + 1)
         ]
 
-    def perform(self, recorder: Recorder) -> None:
+    async def perform(self, recorder: Recorder) -> None:
         """
         This measures the performance of a tool when it performs a given action.
+        The runs' notifications are held and sent together after the last run,
+        so that delivering them can't affect the measurements.
         """
         recorder.notify(
             f"performing {self.__test_maker.test_name()} tests using {self.__tool}")
-        for run in self.__runs:
-            run.perform(recorder)
+        notes = []
+        if self.__concurrent:
+            async with asyncio.TaskGroup() as group:
+                for run in self.__runs:
+                    group.create_task(run.perform(notes))
+        else:
+            for run in self.__runs:
+                await run.perform(notes)
+        recorder.notify_batch(notes)
         result = _TestResult([
             run.duration() for run in self.__runs if run.duration()
         ])
         recorder.log(f"{self.__tool}: {result.geo_mean()} [{result.lb()}, {result.ub()}] s")
 
 
+def _perform_run_set(run_set: _ToolRunSet) -> _BufferedRecorder:
+    """
+    This performs a tool run set in a worker process. The messages it generates
+    are returned for delivery by the parent process.
+    """
+    recorder = _BufferedRecorder()
+    asyncio.run(run_set.perform(recorder))
+    return recorder
+
+
 class _PerformanceComparison:
 
-    def __init__(self, num_runs: int, tools: List[Tool], test_maker: TestFactory):
+    def __init__(
+        self,
+        num_runs: int,
+        tools: List[Tool],
+        test_maker: TestFactory,
+        concurrent_runs: bool,
+        parallel_tools: bool
+    ):
         self.__test_maker = test_maker
+        self.__parallel_tools = parallel_tools
         self.__tool_runs = [
-            _ToolRunSet(num_runs, tool, test_maker) for tool in tools
+            _ToolRunSet(num_runs, tool_id, tool, test_maker, concurrent_runs)
+            for tool_id, tool in enumerate(tools, start=1)
         ]
 
-    def perform(self, recorder: Recorder) -> None:
+    async def perform(self, recorder: Recorder) -> None:
         """
         This measures the performance of each tool when it performs a given action.
         """
         recorder.notify(f"performing {self.__test_maker.test_name()} tests")
         recorder.log(f"\n{self.__test_maker.test_name()} results")
-        for run_set in self.__tool_runs:
-            run_set.perform(recorder)
+        try:
+            self.__test_maker.set_up_shared()
+        except TestFailure as tf:
+            recorder.notify(f"{self.__test_maker.test_name()} tests failed: {tf}")
+            return
+        try:
+            if self.__parallel_tools:
+                await self.__perform_in_parallel(recorder)
+            else:
+                for run_set in self.__tool_runs:
+                    await run_set.perform(recorder)
+        finally:
+            try:
+                self.__test_maker.tear_down_shared()
+            except TestFailure:
+                pass
+
+    async def __perform_in_parallel(self, recorder: Recorder) -> None:
+        """
+        This performs each tool's run set in its own process. Processes are
+        spawned rather than forked so that no iRODS connections are shared
+        with the parent.
+        """
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(
+            max_workers=len(self.__tool_runs),
+            mp_context=multiprocessing.get_context('spawn')
+        ) as executor:
+            buffers = await asyncio.gather(*[
+                loop.run_in_executor(executor, _perform_run_set, run_set)
+                for run_set in self.__tool_runs
+            ])
+        for buffer in buffers:
+            buffer.replay(recorder)
 
 
 class PerformanceSuite:
@@ -252,11 +429,26 @@ class PerformanceSuite:
             measured.
         test_makers  This is a set of test factories, one for each action being
             performed.
+        concurrent_runs  When this is True, the runs of a tool performing an
+            action are performed concurrently instead of one after another.
+            The measurements then reflect contended transfers.
+        parallel_tools  When this is True, each tool performs an action in its
+            own process at the same time as the other tools. Tools and test
+            factories must then be picklable. Since the tools contend for the
+            network, this is intended for comparing separate hardware.
     """
 
-    def __init__(self, num_runs: int, tools: List[Tool], test_makers: List[TestFactory]):
+    def __init__(
+        self,
+        num_runs: int,
+        tools: List[Tool],
+        test_makers: List[TestFactory],
+        concurrent_runs: bool = False,
+        parallel_tools: bool = False
+    ):
         self.__tests = [
-            _PerformanceComparison(num_runs, tools, maker) for maker in test_makers
+            _PerformanceComparison(num_runs, tools, maker, concurrent_runs, parallel_tools)
+            for maker in test_makers
         ]
 
     def run(self, recorder: Recorder) -> None:
@@ -264,6 +456,9 @@ class PerformanceSuite:
         Args:
             recorder: All notifications and logs will be written to the recorder.
         """
+        asyncio.run(self.__run(recorder))
+
+    async def __run(self, recorder: Recorder) -> None:
         recorder.notify("starting performance test suite")
         for test in self.__tests:
-            test.perform(recorder)
+            await test.perform(recorder)
@@ -2,33 +2,64 @@
 
 """
 This provides the logic for performing transfer tests independent of the
-transfer tool. It provides logic for both uploads and downloads.
-
-An upload test performs the following actions. During setup, it creates a file
-of a specific size named "test" locally in the current working directory. Then,
-during its run phase, it uses the Tool object under test to upload this file.
-Finally, during teardown, it deletes both the data object and the local file
-created by the upload
-
-A download test performs the following actions. During setup, it creates a
-file of the size of the data object to be downloaded named "test" locally
-in the current working directory. While still in the set up phase, it
-uploads the file to the current working collection in iRODS. The new data
-object is also named "test". After the file is uploaded it is deleted.
-During the run phase, it uses the Tool object under test to download the
-data object. Finally, during teardown, it deletes both the data object and
-the file created by the download.
+transfer tool. It provides logic for uploads, batch uploads, and downloads.
+
+Each test transfers its own file or data object, so that tests may be
+performed concurrently, even when tools run in separate processes. Their names
+have the form "test-TOOL-N", where TOOL identifies the tool under test by its
+kind and its position among the tools, e.g., "aws1", and N is unique to the
+test among its factory's tests for that tool.
+
+Each factory keeps its local files in a private directory that it creates
+before any of its tests are performed and deletes after all of them have been.
+The private directory is created in the directory named by the PERF_TMP_DIR
+environment variable. By default, this is /dev/shm, if it exists, so that local
+files are held in memory. Otherwise, it is the current working directory.
+
+An upload test performs the following actions. Before any test is performed,
+its factory creates a file of a specific size named "test" locally. This file
+is shared by all of the factory's tests. During setup, an upload test ensures
+there is no data object named "test-TOOL-N". Then, during its run phase, it
+uses the Tool object under test to upload the file as "test-TOOL-N". Finally,
+during teardown, it deletes the data object created by the upload. After all
+tests have been performed, the factory deletes its local directory.
+
+A batch upload test is like an upload test, except that it uploads many files
+at once. Its factory fills its local directory with files of a specific size
+named "test-1", "test-2", etc. During setup, a batch upload
+test creates an empty collection named "test-TOOL-N". During its run phase, it
+uses the Tool object under test to upload the directory's files into this
+collection. During teardown, it deletes the collection. After all tests have
+been performed, the factory deletes its local directory.
+
+A download test performs the following actions. Before any test is performed,
+its factory creates a file of the size of the data object to be downloaded
+named "test" locally and uploads it to the current working collection in
+iRODS. The new data object is also named "test". After the file is uploaded it
+is deleted. This data object is shared by all of the factory's tests. A
+download test has nothing to set up. During the run phase, it uses the Tool
+object under test to download the data object to a file named "test-TOOL-N".
+Finally, during teardown, it deletes the downloaded file. After all tests have
+been performed, the factory deletes the data object and its local directory.
 
 The Python iRODS Client is used to perform the file transfers and clean up
-tasks that happen during setup and teardown. This module assumes that an
-iRODS session has been initialized for the zone where performance testing
-will happen.
+tasks that happen during setup and teardown. A single client session is shared
+by all tests. This module assumes that an iRODS session has been initialized
+for the zone where performance testing will happen.
 """
 
+import atexit
+import functools
 import os
 from os import path
-
-from irods.exception import LOCKED_DATA_OBJECT_ACCESS
+import shutil
+import tempfile
+import threading
+
+from irods.exception import (
+    CAT_NO_ROWS_FOUND, CAT_UNKNOWN_COLLECTION, CollectionDoesNotExist,
+    DataObjectDoesNotExist, iRODSException, LOCKED_DATA_OBJECT_ACCESS,
+    OBJ_PATH_DOES_NOT_EXIST, PycommandsException)
 from irods.session import iRODSSession
 
 from suite import Test, TestFactory, TestFailure, Tool
@@ -36,64 +67,128 @@ from suite import Test, TestFactory, TestFailure, Tool
 
 _DATA_NAME = 'test'
 
+# Local files are kept on tmpfs when possible, so that local disk I/O doesn't
+# limit transfer rates.
+_LOCAL_ROOT = os.environ.get('PERF_TMP_DIR', '/dev/shm' if path.isdir('/dev/shm') else '.')
+
 try:
     _IRODS_ENV_FILE = os.environ['IRODS_ENVIRONMENT_FILE']
 except KeyError:
     _IRODS_ENV_FILE = path.expanduser('~/.irods/irods_environment.json')
 
 
-def _create_file(size: int):
+_SESSION_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _make_session() -> iRODSSession:
+    session = iRODSSession(irods_env_file=_IRODS_ENV_FILE)
+    atexit.register(session.cleanup)
+    return session
+
+
+def _get_session() -> iRODSSession:
+    # Concurrent runs set up in worker threads, and lru_cache alone doesn't
+    # keep them from each creating a session.
+    with _SESSION_LOCK:
+        return _make_session()
+
+
+def _make_local_dir() -> str:
+    try:
+        local_dir = tempfile.mkdtemp(prefix='s3api-perf-', dir=_LOCAL_ROOT)
+    except OSError as oe:
+        raise TestFailure(f"failed to create a directory in {_LOCAL_ROOT}") from oe
+    atexit.register(_delete_local_dir, local_dir)
+    return local_dir
+
+
+def _delete_local_dir(local_dir: str):
+    shutil.rmtree(local_dir, ignore_errors=True)
+
+
+def _create_file(file: str, size: int):
     try:
-        with open(_DATA_NAME, mode='ab') as file:
-            file.truncate(size)
+        fd = os.open(file, os.O_RDWR | os.O_CREAT | os.O_TRUNC)
+        try:
+            if not hasattr(os, 'posix_fallocate'):
+                os.ftruncate(fd, size)
+            elif size > 0:
+                os.posix_fallocate(fd, 0, size)
+        finally:
+            os.close(fd)
     except OSError as oe:
-        error_msg = f"failed to create file {_DATA_NAME} of size {size} B"
+        error_msg = f"failed to create file {file} of size {size} B"
         raise TestFailure(error_msg) from oe
 
 
-def _delete_file():
-    if path.exists(_DATA_NAME):
-        os.remove(_DATA_NAME)
+def _test_name(tool: Tool, tool_id: int, test_id: int) -> str:
+    return f'{_DATA_NAME}-{type(tool).__name__.lower()}{tool_id}-{test_id}'
 
 
-def _irods_path(irods):
-    return f"/{irods.zone}/home/{irods.username}/{_DATA_NAME}"
+def _delete_file(file: str):
+    if path.exists(file):
+        os.remove(file)
 
 
-def _delete_data_obj(irods):
+def _irods_path(irods, name: str):
+    return f"/{irods.zone}/home/{irods.username}/{name}"
+
+
+def _delete_data_obj(irods, name: str):
+    # Attempting the unlink costs one round trip, where checking for existence
+    # first would cost two.
     try:
-        abs_path = _irods_path(irods)
-        if irods.data_objects.exists(abs_path):
-            irods.data_objects.unlink(abs_path, force=True)
+        irods.data_objects.unlink(_irods_path(irods, name), force=True)
+    except (CAT_NO_ROWS_FOUND, DataObjectDoesNotExist, OBJ_PATH_DOES_NOT_EXIST):
+        pass
     except LOCKED_DATA_OBJECT_ACCESS as exn:
-        error_msg = f"failed to delete data object {_DATA_NAME}"
+        error_msg = f"failed to delete data object {name}"
         raise TestFailure(error_msg) from exn
 
 
-def _create_data_obj(irods, size: int):
-    _create_file(size)
-    irods.data_objects.put(_DATA_NAME, _irods_path(irods), force=True)
-    _delete_file()
+def _delete_coll(irods, name: str):
+    try:
+        irods.collections.remove(_irods_path(irods, name), recurse=True, force=True)
+    except (CAT_NO_ROWS_FOUND, CAT_UNKNOWN_COLLECTION, CollectionDoesNotExist):
+        pass
+    except (iRODSException, PycommandsException) as exn:
+        error_msg = f"failed to delete collection {name}"
+        raise TestFailure(error_msg) from exn
+
+
+def _create_coll(irods, name: str):
+    try:
+        irods.collections.create(_irods_path(irods, name))
+    except (iRODSException, PycommandsException) as exn:
+        error_msg = f"failed to create collection {name}"
+        raise TestFailure(error_msg) from exn
+
+
+def _create_data_obj(irods, name: str, size: int, local_dir: str):
+    file = path.join(local_dir, name)
+    _create_file(file, size)
+    irods.data_objects.put(file, _irods_path(irods, name), force=True)
+    _delete_file(file)
 
 
 class _DownloadTest(Test):
 
-    def __init__(self, tool: Tool, data_size: int):
-        super(Test, self).__init__()
+    __slots__ = ('__tool', '__file')
+
+    def __init__(self, tool: Tool, file: str):
+        super().__init__()
         self.__tool = tool
-        self.__data_size = data_size
+        self.__file = file
 
-    def _run(self):
-        self.__tool.download(_DATA_NAME)
+    async def _run(self):
+        await self.__tool.download(_DATA_NAME, self.__file)
 
     def _set_up(self):
-        with iRODSSession(irods_env_file=_IRODS_ENV_FILE) as session:
-            _create_data_obj(session, self.__data_size)
+        pass
 
     def _tear_down(self):
-        _delete_file()
-        with iRODSSession(irods_env_file=_IRODS_ENV_FILE) as session:
-            _delete_data_obj(session)
+        _delete_file(self.__file)
 
 
 class DownloadTestFactory(TestFactory):
@@ -104,35 +199,44 @@ class DownloadTestFactory(TestFactory):
 
     def __init__(self, data_size: int):
         self.__data_size = data_size
+        self.__test_count = 0
+        self.__local_dir = None
 
     def test_name(self):
         return f'{self.__data_size} B download'
 
-    def make_test(self, tool: Tool):
-        return _DownloadTest(tool, self.__data_size)
+    def make_test(self, tool: Tool, tool_id: int):
+        self.__test_count += 1
+        name = _test_name(tool, tool_id, self.__test_count)
+        return _DownloadTest(tool, path.join(self.__local_dir, name))
+
+    def set_up_shared(self):
+        self.__local_dir = _make_local_dir()
+        _create_data_obj(_get_session(), _DATA_NAME, self.__data_size, self.__local_dir)
+
+    def tear_down_shared(self):
+        _delete_local_dir(self.__local_dir)
+        _delete_data_obj(_get_session(), _DATA_NAME)
 
 
 class _UploadTest(Test):
 
-    def __init__(self, tool: Tool, data_size: int):
-        super(Test, self).__init__()
-        self.__tool = tool
-        self.__data_size = data_size
-        self.__irods = iRODSSession(irods_env_file=_IRODS_ENV_FILE)
+    __slots__ = ('__tool', '__file', '__name')
 
-    def __del__(self):
-        self.__irods.cleanup()
+    def __init__(self, tool: Tool, file: str, name: str):
+        super().__init__()
+        self.__tool = tool
+        self.__file = file
+        self.__name = name
 
-    def _run(self):
-        self.__tool.upload(_DATA_NAME)
+    async def _run(self):
+        await self.__tool.upload(self.__file, self.__name)
 
     def _set_up(self):
-        _delete_data_obj(self.__irods)
-        _create_file(self.__data_size)
+        _delete_data_obj(_get_session(), self.__name)
 
     def _tear_down(self):
-        _delete_data_obj(self.__irods)
-        _delete_file()
+        _delete_data_obj(_get_session(), self.__name)
 
 
 class UploadTestFactory(TestFactory):
@@ -143,9 +247,73 @@ class UploadTestFactory(TestFactory):
 
     def __init__(self, data_size: int):
         self.__data_size = data_size
+        self.__test_count = 0
+        self.__file = None
 
     def test_name(self):
         return f'{self.__data_size} B upload'
 
-    def make_test(self, tool: Tool):
-        return _UploadTest(tool, self.__data_size)
+    def make_test(self, tool: Tool, tool_id: int):
+        self.__test_count += 1
+        name = _test_name(tool, tool_id, self.__test_count)
+        return _UploadTest(tool, self.__file, name)
+
+    def set_up_shared(self):
+        self.__file = path.join(_make_local_dir(), _DATA_NAME)
+        _create_file(self.__file, self.__data_size)
+
+    def tear_down_shared(self):
+        _delete_local_dir(path.dirname(self.__file))
+
+
+class _BatchUploadTest(Test):
+
+    __slots__ = ('__tool', '__local_dir', '__name')
+
+    def __init__(self, tool: Tool, local_dir: str, name: str):
+        super().__init__()
+        self.__tool = tool
+        self.__local_dir = local_dir
+        self.__name = name
+
+    async def _run(self):
+        await self.__tool.batch_upload(self.__local_dir, self.__name)
+
+    def _set_up(self):
+        irods = _get_session()
+        _delete_coll(irods, self.__name)
+        _create_coll(irods, self.__name)
+
+    def _tear_down(self):
+        _delete_coll(_get_session(), self.__name)
+
+
+class BatchUploadTestFactory(TestFactory):
+    """This is a factory for generating Test objects for batch upload testing.
+    Parameters:
+        num_files  This is the number of files to upload at once.
+        data_size  This is the size in bytes of each file to upload.
+    """
+
+    def __init__(self, num_files: int, data_size: int):
+        self.__num_files = num_files
+        self.__data_size = data_size
+        self.__test_count = 0
+        self.__local_dir = None
+
+    def test_name(self):
+        return f'{self.__num_files} x {self.__data_size} B batch upload'
+
+    def make_test(self, tool: Tool, tool_id: int):
+        self.__test_count += 1
+        name = _test_name(tool, tool_id, self.__test_count)
+        return _BatchUploadTest(tool, self.__local_dir, name)
+
+    def set_up_shared(self):
+        self.__local_dir = _make_local_dir()
+        for file_id in range(1, self.__num_files + 1):
+            file = path.join(self.__local_dir, f'{_DATA_NAME}-{file_id}')
+            _create_file(file, self.__data_size)
+
+    def tear_down_shared(self):
+        _delete_local_dir(self.__local_dir)